@@ -1,10 +1,10 @@
 # dashboard/app.py
 import streamlit as st
-from data_loader import DataLoader
+from data_loader import get_data_loader
 
 # Initialize FIRST - before any session state access
 if 'data_loader' not in st.session_state:
-    st.session_state.data_loader = DataLoader()
+    st.session_state.data_loader = get_data_loader()
 
 # Set page config AFTER initialization
 st.set_page_config(
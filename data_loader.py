@@ -1,8 +1,109 @@
 ##dashboard/data_loader.py
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import streamlit as st
 
+# Copy-on-Write is always on from pandas 3.0; opt in explicitly on 2.x
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+# Parquet schema metadata key recording which CSV read produced a sidecar
+SIDECAR_SOURCE_KEY = b"dashboard.source"
+
+
+def _sidecar_stamp(mtime, size, parse_dates):
+    """Identity of a CSV read: source mtime and size plus the parsed date columns"""
+    return json.dumps({
+        "mtime": mtime,
+        "size": size,
+        "parse_dates": sorted(parse_dates) if parse_dates else []
+    }).encode()
+
+
+@st.cache_data(show_spinner=False)
+def _load_csv_cached(path, mtime, size, parse_dates=None):
+    """Parse a CSV once per (path, mtime, size, parse_dates) and share it across
+    reruns and sessions.
+
+    A Parquet sibling is written on first parse and read instead of the CSV
+    while its stamp matches the CSV's mtime and size and the requested
+    parse_dates; any other sidecar is rewritten.
+    """
+    parquet_path = path + ".parquet"
+    stamp = _sidecar_stamp(mtime, size, parse_dates)
+    if os.path.exists(parquet_path):
+        try:
+            metadata = pq.read_schema(parquet_path).metadata or {}
+        except (OSError, ValueError):
+            metadata = {}
+        if metadata.get(SIDECAR_SOURCE_KEY) == stamp:
+            table = pq.read_table(parquet_path, memory_map=True)
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    df = pd.read_csv(
+        path,
+        engine="pyarrow",
+        parse_dates=list(parse_dates) if parse_dates else None
+    )
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**table.schema.metadata, SIDECAR_SOURCE_KEY: stamp})
+        pq.write_table(table, parquet_path, compression="zstd")
+    except OSError:
+        # Read-only data directory: keep serving from the CSV
+        pass
+    return df
+
+
+def read_csv_cached(path, parse_dates=None):
+    """Cached CSV read, invalidated when the file's mtime or size changes"""
+    path = str(path)
+    stat = os.stat(path)
+    return _load_csv_cached(
+        path,
+        stat.st_mtime,
+        stat.st_size,
+        tuple(parse_dates) if parse_dates else None
+    )
+
+
+# Target width for integer count columns, applied only when every value fits;
+# money columns stay float64 so costs match to the cent
+DOWNCAST_DTYPES = {
+    "opening_stock": "int32",
+    "closing_stock": "int32",
+    "demand": "int32",
+    "units_sold": "int32",
+    "unmet_demand": "int32",
+    "restocked_qty": "int32",
+    "MOQ": "int16",
+    "lead_time": "int16",
+    "reliability": "int16"
+}
+
+
+# DataLoader attribute -> (file, date columns)
+DATASETS = {
+    "ledger": ("inventory_ledger.csv", ["date", "next_arrival"]),
+    "policies": ("inventory_policy.csv", None),
+    "forecast": ("clean_forecast.csv", ["date"]),
+    "suppliers": ("suppliers1.csv", None),
+    "products": ("products.csv", ["release_date"]),
+    "sales": ("sales_with_pricing_new(1).csv", ["date"])
+}
+
+
+# Columns shown in the inventory tab's restock history
+RESTOCK_COLUMNS = ["date", "restocked_qty", "supplier_id", "next_arrival"]
+
+
 class DataLoader:
     def __init__(self):
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -30,6 +131,19 @@ class DataLoader:
         self.suppliers = None
         self.products = None
         self.sales = None
+        self._ledger_by_product = {}
+        self._last_close = {}
+        self._restocks_by_pid = {}
+        self._policies_by_pid = {}
+        self._supplier_rows = {}
+        self._suppliers_by_product = {}
+        self._forecast_by_pid = {}
+        self._forecast_arrays_by_pid = {}
+        self._sales_by_pid = {}
+        self.merged = pd.DataFrame()
+        self.merged_idx = pd.DataFrame()
+        self.supplier_stats = pd.DataFrame()
+        self.order_analysis = pd.DataFrame()
         
         self._load_all_data()
 
@@ -42,112 +156,279 @@ class DataLoader:
     def _load_all_data(self):
         """Load all datasets with error handling"""
         try:
-            self.ledger = self._load_csv("inventory_ledger.csv", parse_dates=["date", "next_arrival"])
-            self.policies = self._load_csv("inventory_policy.csv")
-            self.forecast = self._load_csv("clean_forecast.csv", parse_dates=["date"])
-            self.suppliers = self._load_csv("suppliers1.csv")
-            self.products = self._load_csv("products.csv", parse_dates=["release_date"])
-            self.sales = self._load_csv("sales_with_pricing_new(1).csv", parse_dates=["date"])
-            
+            # Parsing runs in worker threads; errors are reported back here
+            # because st.* calls need the script thread's run context
+            with ThreadPoolExecutor(max_workers=len(DATASETS)) as pool:
+                futures = {
+                    name: pool.submit(self._read_csv, filename, parse_dates)
+                    for name, (filename, parse_dates) in DATASETS.items()
+                }
+            frames = {}
+            for name, future in futures.items():
+                df, error = future.result()
+                if error:
+                    st.error(error)
+                frames[name] = df
+
+            self.ledger = frames["ledger"]
+            self.policies = frames["policies"]
+            self.forecast = frames["forecast"]
+            self.suppliers = frames["suppliers"]
+            self.products = frames["products"]
+            self.sales = frames["sales"]
+
             self._post_process_data()
-            
+
         except Exception as e:
             st.error(f"Critical data loading error: {str(e)}")
             st.stop()
 
     def _post_process_data(self):
         """Data cleaning and transformation"""
-        if self.ledger is not None:
-            self.ledger["supplier_id"] = self.ledger["supplier_id"].astype(str)
         if self.suppliers is not None:
-            self.suppliers["supplier_id"] = self.suppliers["supplier_id"].astype(str)
-            self.suppliers["lead_time"] = self.suppliers["lead_time"].clip(1, 30).astype(int)
-            self.suppliers["reliability"] = self.suppliers["reliability"].clip(1, 100)
+            self.suppliers = self.suppliers.assign(
+                lead_time=self.suppliers["lead_time"].clip(1, 30).astype(int),
+                reliability=self.suppliers["reliability"].clip(1, 100)
+            )
+
+        self._downcast_dtypes()
+        self._build_indices()
+        self.merged = self._build_merged_ledger()
+        if not self.merged.empty:
+            # Sorted (product_id, date) index turns period filters into contiguous slices
+            self.merged_idx = self.merged.set_index(["product_id", "date"]).sort_index()
+        self._build_supplier_aggregates()
+
+    def _downcast_dtypes(self):
+        """Narrow numeric columns and share id categories across frames"""
+        frames = [self.ledger, self.policies, self.suppliers, self.products, self.sales]
+        for df in frames:
+            if df is None or df.empty:
+                continue
+            for col, dtype in DOWNCAST_DTYPES.items():
+                if col in df.columns and self._fits_dtype(df[col], dtype):
+                    df[col] = df[col].astype(dtype)
+
+        # Shared categories keep merges on integer codes
+        self._share_categories([
+            (self.ledger, "supplier_id"),
+            (self.policies, "supplier_id"),
+            (self.suppliers, "supplier_id")
+        ])
+        self._share_categories([
+            (self.ledger, "product_id"),
+            (self.policies, "product_id"),
+            (self.suppliers, "products"),
+            (self.forecast, "product_id"),
+            (self.sales, "product_id"),
+            (self.products, "product_id")
+        ])
+
+    def _build_indices(self):
+        """Per-product lookups so tabs avoid full-column scans"""
+        if self.ledger is not None and not self.ledger.empty:
+            self._ledger_by_product = self.ledger.groupby("product_id", observed=True).indices
+            self._last_close = (
+                self.ledger.sort_values("date", kind="stable")
+                .groupby("product_id", observed=True)["closing_stock"]
+                .last()
+                .to_dict()
+            )
+            restocks = self.ledger[self.ledger["restocked_qty"] > 0]
+            self._restocks_by_pid = {
+                pid: pa.Table.from_pandas(group[RESTOCK_COLUMNS], preserve_index=False)
+                for pid, group in restocks.groupby("product_id", observed=True)
+            }
+        else:
+            self._ledger_by_product = {}
+            self._last_close = {}
+            self._restocks_by_pid = {}
+
+        self._policies_by_pid = self._rows_by(self.policies, ["product_id"])
+        self._supplier_rows = self._rows_by(self.suppliers, ["products", "supplier_id"])
+        self._suppliers_by_product = self._split_by(self.suppliers, "products")
+        self._forecast_by_pid = self._split_by(self.forecast, "product_id")
+        self._forecast_arrays_by_pid = {
+            pid: self._forecast_arrays(group) for pid, group in self._forecast_by_pid.items()
+        }
+        self._sales_by_pid = self._split_by(self.sales, "product_id")
+
+    @staticmethod
+    def _fits_dtype(series, dtype):
+        """Whether an NA-free integer column casts to dtype without wrapping"""
+        if not pd.api.types.is_integer_dtype(series) or series.isna().any():
+            return False
+        if series.empty:
+            return True
+        info = np.iinfo(dtype)
+        return info.min <= series.min() and series.max() <= info.max
 
-    def _load_csv(self, filename, parse_dates=None):
-        """Enhanced CSV loader with validation"""
+    @staticmethod
+    def _split_by(df, col):
+        """Map each key of col to its sub-frame"""
+        if df is None or df.empty:
+            return {}
+        return dict(iter(df.groupby(col, observed=True, sort=False)))
+
+    @staticmethod
+    def _rows_by(df, keys):
+        """Map each key (first occurrence) to its row as a plain dict"""
+        if df is None or df.empty:
+            return {}
+        rows = df.drop_duplicates(keys).set_index(keys, drop=False)
+        return rows.to_dict("index")
+
+    @staticmethod
+    def _forecast_arrays(forecast):
+        """Date-sorted (int64 ns dates, units) arrays and the units' std"""
+        forecast = forecast.sort_values("date", kind="stable")
+        dates = forecast["date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        units = forecast["predicted_units"].to_numpy(dtype=np.float64)
+        return dates, units, float(forecast["predicted_units"].std())
+
+    @staticmethod
+    def _share_categories(columns):
+        """Convert (frame, column) pairs to one categorical dtype"""
+        columns = [(df, col) for df, col in columns if df is not None and col in df.columns]
+        if not columns:
+            return
+        # Ids are compared as strings, whatever dtype the CSV parser inferred
+        categories = pd.api.types.union_categoricals(
+            [df[col].astype("string").astype("category") for df, col in columns],
+            sort_categories=True
+        ).categories
+        for df, col in columns:
+            df[col] = pd.Categorical(df[col].astype("string"), categories=categories)
+
+    def _read_csv(self, filename, parse_dates=None):
+        """Read and validate a CSV without touching Streamlit; returns (df, error)"""
         path = os.path.join(self.data_dir, filename)
         if not os.path.exists(path):
-            st.error(f"Missing required file: {filename}")
-            return pd.DataFrame()
+            return pd.DataFrame(), f"Missing required file: {filename}"
 
         try:
-            df = pd.read_csv(path, parse_dates=parse_dates)
             required_cols = self.schema.get(filename, [])
-            
-            # Validate columns
-            missing_cols = [col for col in required_cols if col not in df.columns]
+
+            # Validate columns from the header row before parsing the file
+            header = pd.read_csv(path, nrows=0).columns
+            missing_cols = [col for col in required_cols if col not in header]
             if missing_cols:
-                st.error(f"Missing columns in {filename}: {', '.join(missing_cols)}")
-                return pd.DataFrame()
-                
-            return df
-            
+                return pd.DataFrame(), f"Missing columns in {filename}: {', '.join(missing_cols)}"
+
+            return read_csv_cached(path, parse_dates), None
+
         except Exception as e:
-            st.error(f"Error loading {filename}: {str(e)}")
+            return pd.DataFrame(), f"Error loading {filename}: {str(e)}"
+
+
+    def get_product_ledger(self, product_id):
+        """Ledger rows for one product"""
+        return self.ledger.take(self._ledger_by_product.get(product_id, []))
+
+    def get_ledger_slice(self, product_id, start, end):
+        """Merged ledger rows for one product between start and end (inclusive)"""
+        if self.merged_idx.empty:
             return pd.DataFrame()
+        return self.merged_idx.loc[(product_id, slice(start, end)), :].reset_index()
+
+    def get_restocks(self, product_id):
+        """Arrow table of a product's restock events, or None if it has none"""
+        return self._restocks_by_pid.get(product_id)
 
+    def get_current_stock(self, product_id):
+        """Latest closing stock for a product"""
+        return self._last_close.get(product_id)
+
+    def get_forecast_arrays(self, product_id):
+        """(dates_ns, predicted_units, daily_std) for a product, or None"""
+        return self._forecast_arrays_by_pid.get(product_id)
+
+    def get_supplier(self, product_id, supplier_id):
+        """Supplier row dict for a product/supplier pair, or None"""
+        return self._supplier_rows.get((product_id, supplier_id))
 
     def get_product_data(self, product_id):
         """For Inventory and What-If tabs"""
         return {
-            'policy': self.policies[self.policies["product_id"] == product_id].iloc[0] if not self.policies.empty else None,
-            'suppliers': self.suppliers[self.suppliers["products"] == product_id] if not self.suppliers.empty else None,
-            'forecast': self.forecast[self.forecast["product_id"] == product_id] if not self.forecast.empty else None,
-            'sales': self.sales[self.sales["product_id"] == product_id] if not self.sales.empty else None
+            'policy': self._policies_by_pid.get(product_id),
+            'suppliers': self._suppliers_by_product.get(product_id),
+            'forecast': self._forecast_by_pid.get(product_id),
+            'sales': self._sales_by_pid.get(product_id)
         }
 
+    # Frames parsed at construction; shallow copies keep callers' edits off the shared loader
     def load_inventory_ledger(self):
-        """Load and preprocess inventory ledger"""
-        df = self._load_csv("inventory_ledger.csv")
-        if not df.empty:
-            df["date"] = pd.to_datetime(df["date"])
-            df["next_arrival"] = pd.to_datetime(df["next_arrival"])
-        return df
+        """Inventory ledger with parsed dates"""
+        return self.ledger.copy(deep=False)
 
     def load_inventory_policy(self):
-        """Load and validate inventory policies"""
-        return self._load_csv("inventory_policy.csv")
+        """Validated inventory policies"""
+        return self.policies.copy(deep=False)
 
     def load_forecast(self):
-        """Load forecast data with date parsing"""
-        df = self._load_csv("clean_forecast.csv")
-        if not df.empty:
-            df["date"] = pd.to_datetime(df["date"])
-        return df
+        """Forecast data with parsed dates"""
+        return self.forecast.copy(deep=False)
 
     def load_suppliers(self):
-        """Load supplier data with type conversion"""
-        df = self._load_csv("suppliers1.csv")
-        if not df.empty:
-            df["lead_time"] = df["lead_time"].astype(int)
-        return df
+        """Supplier data with integer lead times"""
+        return self.suppliers.copy(deep=False)
 
-    def get_merged_ledger(self):
-        """Merge ledger with policy and supplier data"""
+    def _build_merged_ledger(self):
+        """Join ledger with policy and supplier data in one keyed pass"""
         if self.ledger.empty or self.policies.empty or self.suppliers.empty:
             return pd.DataFrame()
 
-        # First merge policies
-        merged = pd.merge(
-            self.ledger,
-            self.policies[["product_id", "reorder_point", "safety_stock"]],
-            on="product_id",
-            how="left"
+        policies_idx = self.policies.set_index("product_id")[["reorder_point", "safety_stock", "eoq"]]
+        suppliers_idx = self.suppliers.set_index("supplier_id")[["MOQ", "lead_time", "reliability", "products"]]
+        merged = (
+            self.ledger
+            .join(policies_idx, on="product_id", validate="m:1")
+            .join(suppliers_idx, on="supplier_id", validate="m:1")
         )
-        
-        # Then merge suppliers
-        merged = pd.merge(
-            merged,
-            self.suppliers[["supplier_id", "MOQ", "lead_time", "reliability","products"]],
-            on="supplier_id",
-            how="left"
-        )
-        
+
         # Final validation
         required_cols = ["MOQ", "reliability", "lead_time","products"]
         if not all(col in merged.columns for col in required_cols):
             st.error("Critical columns missing after merge")
             return pd.DataFrame()
-            
-        return merged
\ No newline at end of file
+
+        return merged
+
+    def _build_supplier_aggregates(self):
+        """Per-supplier frames for the overview charts; independent of any filter"""
+        if self.merged.empty:
+            self.supplier_stats = pd.DataFrame()
+            self.order_analysis = pd.DataFrame()
+            return
+
+        by_supplier = self.merged.groupby("supplier_id", observed=True)
+        supplier_stats = by_supplier.agg(
+            num_products=("products", "nunique"),
+            lead_time=("lead_time", "mean"),
+            reliability=("reliability", "mean"),
+            MOQ=("MOQ", "mean")
+        )
+        # Dedup + sort up front so the string join runs once per supplier on clean data
+        pairs = (
+            self.merged[["supplier_id", "products"]]
+            .drop_duplicates()
+            .sort_values(["supplier_id", "products"])
+        )
+        product_list = pairs.groupby("supplier_id", sort=False, observed=True)["products"].agg(", ".join)
+        self.supplier_stats = supplier_stats.join(product_list.rename("product_list")).reset_index()
+
+        self.order_analysis = by_supplier.agg(
+            restocked_qty=("restocked_qty", "sum"),
+            lead_time=("lead_time", "mean"),
+            reliability=("reliability", "mean")
+        ).reset_index()
+
+    def get_merged_ledger(self):
+        """Ledger merged with policy and supplier data, built once at load time"""
+        return self.merged
+
+
+@st.cache_resource(show_spinner=False)
+def get_data_loader():
+    """Single DataLoader shared by every session"""
+    return DataLoader()
\ No newline at end of file
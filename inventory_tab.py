@@ -3,32 +3,36 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from data_loader import DataLoader
+from utils import downsample_minmax, memo_figure
 
 def load_inventory_data(loader):
-    """Load and merge required inventory data"""
-    try:
-        ledger = loader.load_inventory_ledger()
-        policies = loader.load_inventory_policy()
-        
-        if ledger.empty or policies.empty:
-            st.error("Missing inventory data!")
-            return pd.DataFrame(), pd.DataFrame()
-            
-        # Merge critical policy columns
-        policy_cols = ['product_id', 'reorder_point', 'safety_stock', 'eoq']
-        merged = pd.merge(
-            ledger,
-            policies[policy_cols],
-            on='product_id',
-            how='left'
-        )
-        
-        return merged, policies
-    
-    except Exception as e:
-        st.error(f"Data loading failed: {str(e)}")
+    """Merged ledger and policies shared by the data loader"""
+    merged = loader.get_merged_ledger()
+    policies = loader.policies
+
+    if merged.empty or policies.empty:
+        st.error("Missing inventory data!")
         return pd.DataFrame(), pd.DataFrame()
 
+    return merged, policies
+
+def stock_movement_figure(product_data, product_policy, selected_product):
+    """Opening/closing stock lines with the reorder point"""
+    fig = px.line(
+        downsample_minmax(product_data, ['opening_stock', 'closing_stock']),
+        x='date',
+        y=['opening_stock', 'closing_stock'],
+        labels={'value': 'Units', 'variable': 'Stock Type'},
+        title=f"Daily Stock Levels - {selected_product}"
+    )
+    fig.add_hline(
+        y=product_policy['reorder_point'],
+        line_dash="dash",
+        line_color="red",
+        annotation_text="Reorder Point"
+    )
+    return fig
+
 def show_inventory(loader):
     """Main inventory tab display"""
     st.title("📦 Live Inventory Management")
@@ -47,36 +51,34 @@ def show_inventory(loader):
         help="Choose a product to view detailed inventory information"
     )
     
-    # Filter data for selected product
-    product_data = merged_ledger[merged_ledger['product_id'] == selected_product]
-    product_policy = policies[policies['product_id'] == selected_product].iloc[0]
+    # Policy for selected product
+    product_policy = loader.get_product_data(selected_product)['policy']
+    if product_policy is None:
+        st.warning(f"No inventory policy found for {selected_product}")
+        return
     
     # Section 1: Stock Movement
     st.header(f"📈 {selected_product} Stock Movement")
     
     # Create time series chart
-    fig = px.line(
-        product_data,
-        x='date',
-        y=['opening_stock', 'closing_stock'],
-        labels={'value': 'Units', 'variable': 'Stock Type'},
-        title=f"Daily Stock Levels - {selected_product}"
-    )
-    fig.add_hline(
-        y=product_policy['reorder_point'],
-        line_dash="dash",
-        line_color="red",
-        annotation_text="Reorder Point"
+    fig = memo_figure(
+        "stock_movement",
+        selected_product,
+        lambda: stock_movement_figure(
+            loader.get_product_ledger(selected_product),
+            product_policy,
+            selected_product
+        )
     )
     st.plotly_chart(fig, use_container_width=True)
     
     # Section 2: Restock History
     st.header("🔄 Restock History")
-    restocks = product_data[product_data['restocked_qty'] > 0]
+    restocks = loader.get_restocks(selected_product)
     
-    if not restocks.empty:
+    if restocks is not None:
         st.dataframe(
-            restocks[['date', 'restocked_qty', 'supplier_id', 'next_arrival']],
+            restocks,
             column_config={
                 "next_arrival": st.column_config.DateColumn(
                     "Expected Arrival",
@@ -94,17 +96,19 @@ def show_inventory(loader):
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Current Stock", int(product_data['closing_stock'].iloc[-1]))
+        st.metric("Current Stock", int(loader.get_current_stock(selected_product)))
     with col2:
         st.metric("Reorder Point", product_policy['reorder_point'])
     with col3:
         st.metric("Safety Stock", product_policy['safety_stock'])
     
     # Policy Table
+    policy_metrics = ['eoq', 'monthly_demand', 'unit_cost']
     st.dataframe(
-        product_policy[['eoq', 'monthly_demand', 'unit_cost']]
-        .reset_index()
-        .rename(columns={'index': 'Metric', 0: 'Value'}),
+        pd.DataFrame({
+            'Metric': policy_metrics,
+            'Value': [product_policy[m] for m in policy_metrics]
+        }),
         column_config={
             "Metric": st.column_config.TextColumn("Policy Metric"),
             "Value": st.column_config.NumberColumn(format="%.2f")
@@ -1,8 +1,9 @@
 # dashboard/overview_tab.py
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
+from utils import downsample_minmax, memo_figure
 
 # Modern Color Scheme
 COLORS = {
@@ -18,11 +19,9 @@ COLORS = {
     "highlight": "#FFD700"      # Gold
 }
 
-def create_metric_card(title, value, help_text, color=COLORS["primary"], icon="📊", delta=None):
-    """Modern metric card with adaptive colors"""
-    text_color = COLORS["text_light"] if color in [COLORS["primary"], COLORS["negative"], COLORS["positive"]] else COLORS["text_dark"]
-    return f"""
-    <div style="
+# Card markup is static; only the values change per render
+METRIC_CARD_TEMPLATE = """<div style="
+        flex: 1;
         background: {color};
         padding: 1.5rem;
         border-radius: 10px;
@@ -37,275 +36,314 @@ def create_metric_card(title, value, help_text, color=COLORS["primary"], icon="
                     {title}
                 </h3>
                 <div style="font-size: 1.75rem; font-weight: 700;">
-                    {value}{delta if delta else ''}
+                    {value}{delta}
                 </div>
                 <div style="font-size: 0.9rem; opacity: 0.9;">
                     {help_text}
                 </div>
             </div>
         </div>
-    </div>
-    """
+    </div>"""
 
-def overview_tab():
-    """Modern Inventory Overview Dashboard"""
-    try:
-        # ==================== HEADER ====================
-        st.markdown(f"""
-        <div style="
-            background: {COLORS["header"]};
-            padding: 2.5rem;
-            border-radius: 15px;
-            color: {COLORS["text_light"]};
-            margin-bottom: 2rem;
-        ">
-            <div style="max-width: 1200px; margin: 0 auto;">
-                <h1 style="margin:0; font-size: 2.5rem;">Supply Chain Intelligence</h1>
-                <p style="margin:0.5rem 0 0 0; font-size: 1.1rem;">
-                    Holistic view of inventory health, supplier performance, and operational efficiency
-                </p>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+# Cards are joined without blank lines so markdown keeps the row as one HTML block
+METRIC_ROW_TEMPLATE = '<div style="display: flex; gap: 1rem;">{cards}</div>'
 
-        # ==================== DATA LOADING ====================
-        loader = st.session_state.data_loader
-        merged = loader.get_merged_ledger()
-        
-        if merged.empty:
-            st.warning("No operational data available")
-            return
+def create_metric_card(title, value, help_text, color=COLORS["primary"], icon="📊", delta=None):
+    """Modern metric card with adaptive colors"""
+    text_color = COLORS["text_light"] if color in [COLORS["primary"], COLORS["negative"], COLORS["positive"]] else COLORS["text_dark"]
+    return METRIC_CARD_TEMPLATE.format(
+        color=color,
+        text_color=text_color,
+        icon=icon,
+        title=title,
+        value=value,
+        delta=delta if delta else '',
+        help_text=help_text
+    )
 
-        # ==================== INTERACTIVE CONTROLS ====================
-        with st.expander("⚙️ Dashboard Controls", expanded=True):
-            cols = st.columns(3)
-            with cols[0]:
-                date_range = st.date_input(
-                    "Reporting Period",
-                    value=[merged['date'].min().date(), merged['date'].max().date()]
-                )
-            with cols[1]:
-                selected_product = st.selectbox(
-                    "Focus Product",
-                    merged['product_id'].unique()
-                )
-            with cols[2]:
-                view_mode = st.radio(
-                    "View Mode",
-                    ["Overview"],
-                    horizontal=True
-                )
+@st.cache_data(show_spinner=False)
+def compute_kpis(_filtered, selected_product, start_dt, end_dt):
+    """KPIs for one product/period, reading each column of the slice once"""
+    demand = _filtered['demand'].to_numpy(dtype=np.float64)
+    unmet = _filtered['unmet_demand'].to_numpy(dtype=np.float64)
+    lead_time = _filtered['lead_time'].to_numpy(dtype=np.float64)
+    reliability = _filtered['reliability'].to_numpy(dtype=np.float64)
+    restocked = _filtered['restocked_qty'].to_numpy()
+    moq = _filtered['MOQ'].to_numpy()
 
-        # Data Filtering
-        start_dt = pd.to_datetime(date_range[0])
-        end_dt = pd.to_datetime(date_range[1])
-        filtered = merged[
-            (merged['date'] >= start_dt) & 
-            (merged['date'] <= end_dt) &
-            (merged['product_id'] == selected_product)
-        ].copy()
+    if lead_time.size == 0:
+        return np.nan, np.nan, np.nan, np.nan
 
-        # ==================== CORE METRICS ====================
-        st.markdown("""
-        <div style="margin: 2rem 0 1rem 0;">
-            <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
-                padding-bottom: 0.5rem; font-size: 1.4rem;">
-                Key Performance Indicators
-            </h2>
-        </div>
-        """, unsafe_allow_html=True)
+    service_level = 1.0 - float(unmet.sum()) / max(float(demand.sum()), 1.0)
+    avg_lead_time = lead_time.mean()
+    supplier_risk_score = (lead_time * (100 - reliability)).mean() / 100
+    q75 = np.quantile(lead_time, 0.75)
+    order_efficiency = ((restocked >= moq) & (lead_time <= q75)).mean()
+    return service_level, supplier_risk_score, avg_lead_time, order_efficiency
 
-        # Calculate Advanced Metrics
-        service_level = 1 - (filtered['unmet_demand'].sum() / filtered['demand'].sum())
-        supplier_risk_score = (filtered['lead_time'] * (100 - filtered['reliability'])).mean() / 100
-        avg_lead_time = filtered['lead_time'].mean()
-        order_efficiency = ((filtered['restocked_qty'] >= filtered['MOQ']) & 
-                    (filtered['lead_time'] <= filtered['lead_time'].quantile(0.75))).mean()
+def stock_position_figure(filtered, selected_product):
+    """Closing stock area chart with the safety-stock band"""
+    series = downsample_minmax(filtered, 'closing_stock')
+    fig = go.Figure(go.Scatter(
+        x=series['date'].to_numpy(),
+        y=series['closing_stock'].to_numpy(),
+        mode='lines',
+        fill='tozeroy',
+        line_color=COLORS["secondary"],
+        name='Units Available',
+        hovertemplate="%{y}<extra></extra>"
+    ))
+    fig.add_hrect(
+        y0=0,
+        y1=filtered['safety_stock'].mean(),
+        fillcolor=COLORS["negative"],
+        opacity=0.1,
+        annotation_text="Safety Threshold",
+        annotation_position="top left"
+    )
+    fig.update_layout(
+        title=f"{selected_product} Stock Position",
+        xaxis_title="date",
+        yaxis_title="Units Available",
+        plot_bgcolor=COLORS["background"],
+        paper_bgcolor=COLORS["background"],
+        font_color=COLORS["text_dark"],
+        hovermode="x unified"
+    )
+    return fig
 
+@st.cache_data(show_spinner=False)
+def supplier_treemap(supplier_stats):
+    """Supplier network treemap"""
+    fig = go.Figure(go.Treemap(
+        ids=supplier_stats['supplier_id'].astype(str).to_numpy(),
+        labels=supplier_stats['supplier_id'].astype(str).to_numpy(),
+        parents=np.full(len(supplier_stats), ""),
+        values=supplier_stats['num_products'].to_numpy(),
+        branchvalues="total",
+        marker=dict(
+            colors=supplier_stats['lead_time'].to_numpy(),
+            coloraxis="coloraxis",
+            line=dict(color=COLORS["background"], width=2)
+        ),
+        customdata=np.column_stack([
+            supplier_stats['product_list'].to_numpy(),
+            supplier_stats['reliability'].to_numpy(),
+            supplier_stats['MOQ'].to_numpy()
+        ]),
+        hovertemplate=(
+            "<b>%{label}</b><br>"
+            "Products: %{customdata[0]}<br>"
+            "Reliability %: %{customdata[1]:.1f}<br>"
+            "Min Order Qty: %{customdata[2]:.0f}<br>"
+            "Avg Lead Time: %{color:.1f}<extra></extra>"
+        ),
+        textinfo="label+value",
+        texttemplate="<b>%{label}</b><br>%{value} products<br>%{color:.1f} days"
+    ))
+    fig.update_layout(
+        title="Supplier Network Analysis",
+        margin=dict(t=50, l=25, r=25, b=25),
+        coloraxis=dict(colorscale='RdYlGn_r'),
+        coloraxis_colorbar=dict(
+            title="Lead Time (Days)",
+            tickvals=[supplier_stats['lead_time'].min(), supplier_stats['lead_time'].max()],
+            ticktext=["Fast", "Slow"]
+        )
+    )
+    return fig
+
+@st.cache_data(show_spinner=False)
+def orders_bar(order_analysis):
+    """Units ordered per supplier, coloured by lead time"""
+    fig = go.Figure(go.Bar(
+        x=order_analysis['supplier_id'].astype(str).to_numpy(),
+        y=order_analysis['restocked_qty'].to_numpy(),
+        marker=dict(
+            color=order_analysis['lead_time'].to_numpy(),
+            coloraxis="coloraxis",
+            line=dict(color=COLORS["text_dark"], width=1.5)
+        ),
+        texttemplate="%{y:.2s}",
+        textfont_color=COLORS["text_light"],
+        hovertemplate="Supplier: %{x}<br>Total Units Ordered: %{y}<br>Lead Time: %{marker.color:.1f}<extra></extra>"
+    ))
+    fig.update_layout(
+        plot_bgcolor=COLORS["background"],
+        paper_bgcolor=COLORS["background"],
+        font_color=COLORS["text_dark"],
+        xaxis_title="Supplier",
+        yaxis_title="Total Orders",
+        coloraxis=dict(colorscale='Magma'),
+        coloraxis_colorbar=dict(
+            title="Lead Time (Days)",
+            orientation="h",
+            yanchor="bottom",
+            y=-0.5
+        )
+    )
+    return fig
+
+def overview_tab():
+    """Modern Inventory Overview Dashboard"""
+    # ==================== HEADER ====================
+    st.markdown(f"""
+    <div style="
+        background: {COLORS["header"]};
+        padding: 2.5rem;
+        border-radius: 15px;
+        color: {COLORS["text_light"]};
+        margin-bottom: 2rem;
+    ">
+        <div style="max-width: 1200px; margin: 0 auto;">
+            <h1 style="margin:0; font-size: 2.5rem;">Supply Chain Intelligence</h1>
+            <p style="margin:0.5rem 0 0 0; font-size: 1.1rem;">
+                Holistic view of inventory health, supplier performance, and operational efficiency
+            </p>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # ==================== DATA LOADING ====================
+    loader = st.session_state.data_loader
+    merged = loader.get_merged_ledger()
+    
+    if merged.empty:
+        st.warning("No operational data available")
+        return
 
+    # ==================== INTERACTIVE CONTROLS ====================
+    with st.expander("⚙️ Dashboard Controls", expanded=True):
         cols = st.columns(3)
         with cols[0]:
-            st.markdown(create_metric_card(
-                "Avg Lead Time",
-                f"{avg_lead_time:.1f}d",
-                "Supplier responsiveness",
-                COLORS["secondary"],
-                "⏱️",
-                delta="▲ 2d" if avg_lead_time > 7 else "▼ 1d"
-            ), unsafe_allow_html=True)
-        
+            date_range = st.date_input(
+                "Reporting Period",
+                value=[merged['date'].min().date(), merged['date'].max().date()]
+            )
         with cols[1]:
-            st.markdown(create_metric_card(
-                "Service Level",
-                f"{service_level:.0%}",
-                "Demand fulfillment",
-                COLORS["positive"] if service_level > 0.9 else COLORS["negative"],
-                "✅"
-            ), unsafe_allow_html=True)
-
+            selected_product = st.selectbox(
+                "Focus Product",
+                merged['product_id'].unique()
+            )
         with cols[2]:
-            st.markdown(create_metric_card(
-                "Supplier Risk",
-                f"{supplier_risk_score:.1f}",
-                "Lower is better",
-                COLORS["negative"] if supplier_risk_score > 5 else COLORS["positive"],
-                "⚠️"
-            ), unsafe_allow_html=True)
+            view_mode = st.radio(
+                "View Mode",
+                ["Overview"],
+                horizontal=True
+            )
 
-        '''with cols[3]:
-            st.markdown(create_metric_card(
-                "Order Efficiency",
-                f"{order_efficiency:.0%}",
-                "MOQ + Lead Time",
-                COLORS["accent"],
-                "⚡"
-            ), unsafe_allow_html=True)'''
+    # Data Filtering
+    if len(date_range) != 2:
+        st.info("Select a start and end date for the reporting period")
+        return
+    start_dt = pd.to_datetime(date_range[0])
+    end_dt = pd.to_datetime(date_range[1])
+    filtered = loader.get_ledger_slice(selected_product, start_dt, end_dt)
 
-        # ==================== INVENTORY HEALTH ====================
-        st.markdown("""
-        <div style="margin: 3rem 0 1rem 0;">
-            <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
-                padding-bottom: 0.5rem; font-size: 1.4rem;">
-                Inventory Health Timeline
-            </h2>
-        </div>
-        """, unsafe_allow_html=True)
+    if filtered.empty:
+        st.info("No data for selection")
+        return
 
-        fig = px.area(
-            filtered,
-            x='date',
-            y='closing_stock',
-            title=f"{selected_product} Stock Position",
-            labels={'closing_stock': 'Units Available'},
-            color_discrete_sequence=[COLORS["secondary"]]
-        )
-        fig.add_hrect(
-            y0=0,
-            y1=filtered['safety_stock'].mean(),
-            fillcolor=COLORS["negative"],
-            opacity=0.1,
-            annotation_text="Safety Threshold", 
-            annotation_position="top left"
-        )
-        fig.update_layout(
-            plot_bgcolor=COLORS["background"],
-            paper_bgcolor=COLORS["background"],
-            font_color=COLORS["text_dark"],
-            hovermode="x unified"
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    # ==================== CORE METRICS ====================
+    st.markdown("""
+    <div style="margin: 2rem 0 1rem 0;">
+        <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
+            padding-bottom: 0.5rem; font-size: 1.4rem;">
+            Key Performance Indicators
+        </h2>
+    </div>
+    """, unsafe_allow_html=True)
 
-        # ==================== SUPPLIER PERFORMANCE MATRIX ====================
-        st.markdown("""
-        <div style="margin: 3rem 0 1rem 0;">
-            <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
-                padding-bottom: 0.5rem; font-size: 1.4rem;">
-                Supplier Performance Matrix
-            </h2>
-        </div>
-        """, unsafe_allow_html=True)
+    # Calculate Advanced Metrics
+    service_level, supplier_risk_score, avg_lead_time, order_efficiency = compute_kpis(
+        filtered, selected_product, start_dt, end_dt
+    )
 
-        supplier_stats = merged.groupby('supplier_id').agg(
-            num_products=('products', 'nunique'),
-            product_list=('products', lambda x: ', '.join(sorted(x.unique()))),
-            lead_time=('lead_time', 'mean'),
-            reliability=('reliability', 'mean'),
-            MOQ=('MOQ', 'mean')
-        ).reset_index()
 
-        fig = px.treemap(
-            supplier_stats,
-            path=['supplier_id'],
-            values='num_products',
-            color='lead_time',
-            color_continuous_scale='RdYlGn_r',
-            hover_data= ['product_list','reliability', 'MOQ'],
-            title="Supplier Network Analysis",
-            labels={
-                'lead_time': 'Avg Lead Time',
-                'reliability': 'Reliability %',
-                'MOQ': 'Min Order Qty'
-            }
-        )
-        fig.update_layout(
-            margin=dict(t=50, l=25, r=25, b=25),
-            coloraxis_colorbar=dict(
-                title="Lead Time (Days)",
-                tickvals=[supplier_stats['lead_time'].min(), supplier_stats['lead_time'].max()],
-                ticktext=["Fast", "Slow"]
-            )
-        )
-        fig.update_traces(
-            textinfo="label+value",
-            texttemplate="<b>%{label}</b><br>%{value} products<br>%{color:.1f} days",
-            marker=dict(line=dict(color=COLORS["background"], width=2))
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    cards_html = [
+        create_metric_card(
+            "Avg Lead Time",
+            f"{avg_lead_time:.1f}d",
+            "Supplier responsiveness",
+            COLORS["secondary"],
+            "⏱️",
+            delta="▲ 2d" if avg_lead_time > 7 else "▼ 1d"
+        ),
+        create_metric_card(
+            "Service Level",
+            f"{service_level:.0%}",
+            "Demand fulfillment",
+            COLORS["positive"] if service_level > 0.9 else COLORS["negative"],
+            "✅"
+        ),
+        create_metric_card(
+            "Supplier Risk",
+            f"{supplier_risk_score:.1f}",
+            "Lower is better",
+            COLORS["negative"] if supplier_risk_score > 5 else COLORS["positive"],
+            "⚠️"
+        ),
+        # create_metric_card(
+        #     "Order Efficiency",
+        #     f"{order_efficiency:.0%}",
+        #     "MOQ + Lead Time",
+        #     COLORS["accent"],
+        #     "⚡"
+        # ),
+    ]
+    # One markdown message for the whole row instead of one per card
+    st.markdown(METRIC_ROW_TEMPLATE.format(cards="".join(cards_html)), unsafe_allow_html=True)
 
-        # ==================== ORDER INTELLIGENCE ====================
-        st.markdown("""
-        <div style="margin: 3rem 0 1rem 0;">
-            <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
-                padding-bottom: 0.5rem; font-size: 1.4rem;">
-                Order Intelligence
-            </h2>
-        </div>
-        """, unsafe_allow_html=True)
+    # ==================== INVENTORY HEALTH ====================
+    st.markdown("""
+    <div style="margin: 3rem 0 1rem 0;">
+        <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
+            padding-bottom: 0.5rem; font-size: 1.4rem;">
+            Inventory Health Timeline
+        </h2>
+    </div>
+    """, unsafe_allow_html=True)
 
-        order_analysis = merged.groupby('supplier_id').agg({
-            'restocked_qty': 'sum',
-            'lead_time': 'mean',
-            'reliability': 'mean'
-        }).reset_index()
+    fig = memo_figure(
+        "stock_position",
+        (selected_product, start_dt, end_dt),
+        lambda: stock_position_figure(filtered, selected_product)
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
-        fig = px.bar(
-            order_analysis,
-            x='supplier_id',
-            y='restocked_qty',
-            color='lead_time',
-            color_continuous_scale=px.colors.sequential.Magma,
-            labels={'restocked_qty': 'Total Units Ordered'},
-            text_auto='.2s'
-        )
-        fig.update_layout(
-            plot_bgcolor=COLORS["background"],
-            paper_bgcolor=COLORS["background"],
-            font_color=COLORS["text_dark"],
-            xaxis_title="Supplier",
-            yaxis_title="Total Orders",
-            coloraxis_colorbar=dict(
-                title="Lead Time (Days)",
-                orientation="h",
-                yanchor="bottom",
-                y=-0.5
-            )
-        )
-        fig.update_traces(
-            textfont_color=COLORS["text_light"],
-            marker_line_color=COLORS["text_dark"],
-            marker_line_width=1.5
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    # ==================== SUPPLIER PERFORMANCE MATRIX ====================
+    st.markdown("""
+    <div style="margin: 3rem 0 1rem 0;">
+        <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
+            padding-bottom: 0.5rem; font-size: 1.4rem;">
+            Supplier Performance Matrix
+        </h2>
+    </div>
+    """, unsafe_allow_html=True)
 
-    except Exception as e:
-        st.error(f"System error: {str(e)}")
-        st.markdown(f"""
-            <div style="
-                background: #FFEBEE;
-                padding: 1.5rem;
-                border-radius: 10px;
-                margin-top: 1rem;
-            ">
-                <h4 style="color: {COLORS["negative"]}; margin: 0 0 1rem 0;">
-                    ⚠️ System Recovery Required
-                </h4>
-                <ol style="color: {COLORS["text_dark"]};">
-                    <li>Refresh application</li>
-                    <li>Verify data files in /data directory</li>
-                    <li>Contact supplychain-support@company.com</li>
-                </ol>
-            </div>
-        """, unsafe_allow_html=True)
+    fig = memo_figure(
+        "supplier_treemap",
+        len(loader.supplier_stats),
+        lambda: supplier_treemap(loader.supplier_stats)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    # ==================== ORDER INTELLIGENCE ====================
+    st.markdown("""
+    <div style="margin: 3rem 0 1rem 0;">
+        <h2 style="color: #faf9f5; border-bottom: 2px solid #5C6BC0; 
+            padding-bottom: 0.5rem; font-size: 1.4rem;">
+            Order Intelligence
+        </h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    fig = memo_figure(
+        "orders_bar",
+        len(loader.order_analysis),
+        lambda: orders_bar(loader.order_analysis)
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
 if __name__ == "__main__":
     overview_tab()
\ No newline at end of file
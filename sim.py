@@ -1,125 +1,339 @@
 # dashboard/what_if_simulator.py
+import itertools
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import streamlit as st
 import plotly.express as px
+from data_loader import get_data_loader
+
+try:
+    from numba import config as numba_config, njit, prange
+    # TBB pools started from Streamlit's script thread block interpreter exit
+    numba_config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+except ImportError:  # Numba is optional; the kernels then run as plain Python
+    prange = range
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# First day of every simulation horizon
+START_DATE = pd.Timestamp("2025-04-01")
+
+
+@njit(cache=True)
+def _simulate_kernel(demand, initial_stock, reorder_point, order_qty, lead_time_days,
+                     unit_cost, holding_rate_daily, order_cost):
+    """Daily stock recurrence over a dense demand array.
+
+    Stock is float64 because forecast demand is fractional. At most one order
+    is outstanding; it lands lead_time_days after it is placed.
+    """
+    n_days = demand.shape[0]
+    opening = np.empty(n_days)
+    sold = np.empty(n_days)
+    unmet = np.empty(n_days)
+    closing = np.empty(n_days)
+    restock = np.zeros(n_days, dtype=np.int64)
+    holding_cost = np.empty(n_days)
+    ordering_cost = np.zeros(n_days, dtype=np.int64)
+    # Units arriving on each day offset; orders may land past the horizon
+    arrivals = np.zeros(n_days + lead_time_days + 1)
+    pending_until = 0
+
+    stock = initial_stock
+    for i in range(n_days):
+        # Process order arrivals
+        stock += arrivals[i]
+        opening[i] = stock
+
+        # Calculate transactions
+        sold_today = min(stock, demand[i])
+        sold[i] = sold_today
+        unmet[i] = max(0.0, demand[i] - sold_today)
+        closing_stock = stock - sold_today
+        closing[i] = closing_stock
+
+        # Order placement logic
+        if closing_stock < reorder_point and i >= pending_until:
+            arrivals[i + lead_time_days] += order_qty
+            restock[i] = order_qty
+            ordering_cost[i] = order_cost
+            pending_until = i + lead_time_days
+
+        holding_cost[i] = closing_stock * unit_cost * holding_rate_daily
+        stock = closing_stock
+
+    return opening, sold, unmet, closing, restock, holding_cost, ordering_cost
+
+
+@njit(cache=True, parallel=True)
+def _simulate_batch_kernel(demand, n_days, initial_stock, reorder_point, order_qty,
+                           lead_time_days, unit_cost, holding_rate_daily, order_cost):
+    """Run _simulate_kernel for each row of a (P, T) demand matrix.
+
+    Row p uses its first n_days[p] columns; products are independent, so
+    rows run in parallel under Numba.
+    """
+    n_products, horizon = demand.shape
+    opening = np.zeros((n_products, horizon))
+    sold = np.zeros((n_products, horizon))
+    unmet = np.zeros((n_products, horizon))
+    closing = np.zeros((n_products, horizon))
+    restock = np.zeros((n_products, horizon), dtype=np.int64)
+    holding_cost = np.zeros((n_products, horizon))
+    ordering_cost = np.zeros((n_products, horizon), dtype=np.int64)
+
+    for p in prange(n_products):
+        n = n_days[p]
+        o, s, u, c, r, h, oc = _simulate_kernel(
+            demand[p, :n], initial_stock[p], reorder_point[p], order_qty[p],
+            lead_time_days[p], unit_cost[p], holding_rate_daily, order_cost
+        )
+        opening[p, :n] = o
+        sold[p, :n] = s
+        unmet[p, :n] = u
+        closing[p, :n] = c
+        restock[p, :n] = r
+        holding_cost[p, :n] = h
+        ordering_cost[p, :n] = oc
+
+    return opening, sold, unmet, closing, restock, holding_cost, ordering_cost
+
 
 class InventorySimulator:
-    def __init__(self, data_loader):
-        self.loader = data_loader
+    def __init__(self, data_loader=None):
+        # Default to the process-wide loader rather than parsing the CSVs again
+        self.loader = data_loader if data_loader is not None else get_data_loader()
         self.HOLDING_RATE_DAILY = 0.20 / 365
         self.ORDER_COST = 500
 
     def simulate_product(self, product_id, scenario_params=None):
         """Run simulation with customizable business parameters"""
         try:
-            # Load base data
-            base_policy = self.loader.policies.query(f"product_id == '{product_id}'").iloc[0].copy()
-            suppliers = self.loader.suppliers.query(f"products == '{product_id}'")
-            forecast = self.loader.forecast.query(f"product_id == '{product_id}'").copy()
-            
-            # Apply scenario overrides
-            if scenario_params:
-                supplier = suppliers[
-                    suppliers["supplier_id"] == scenario_params.get('supplier_id', base_policy['supplier_id'])
-                ].iloc[0].copy()
-                
-                policy = base_policy.copy()
-                policy.update({
-                    'eoq': scenario_params.get('eoq', base_policy['eoq']),
-                    'reorder_point': scenario_params.get('reorder_point', base_policy['reorder_point']),
-                    'safety_stock': scenario_params.get('safety_stock', base_policy['safety_stock'])
-                })
-                buffer_days = scenario_params.get('buffer_days', 7)
-            else:
-                supplier = suppliers[
-                    suppliers["supplier_id"] == base_policy['supplier_id']
-                ].iloc[0].copy()
-                policy = base_policy.copy()
-                buffer_days = 7
-
-            # Convert dates
-            forecast["date"] = pd.to_datetime(forecast["date"])
-            start_date = pd.to_datetime("2025-04-01")
-            end_date = start_date + timedelta(days=30 + self._adjusted_lead_time(supplier))
-
-            # Initialize simulation
-            current_stock = self._calculate_initial_stock(policy, supplier, forecast, buffer_days)
-            pending_orders = []
-            ledger = []
-
-            for date in pd.date_range(start_date, end_date):
-                # Process order arrivals
-                arrived = sum(qty for d, qty in pending_orders if d == date)
-                current_stock += arrived
-                pending_orders = [(d, qty) for d, qty in pending_orders if d > date]
-
-                # Get daily demand
-                try:
-                    demand = forecast.loc[forecast["date"] == date, "predicted_units"].values[0]
-                except IndexError:
-                    demand = 0
-
-                # Calculate transactions
-                sold = min(current_stock, demand)
-                unmet = max(0, demand - sold)
-                closing_stock = current_stock - sold
-
-                # Order placement logic
-                restock_qty = 0
-                if closing_stock < policy["reorder_point"] and not pending_orders:
-                    order_qty = max(policy["eoq"], supplier["MOQ"])
-                    lead_time = self._adjusted_lead_time(supplier)
-                    arrival_date = date + timedelta(days=lead_time)
-                    pending_orders.append((arrival_date, int(order_qty)))
-                    restock_qty = int(order_qty)
-
-                # Calculate costs
-                holding_cost = closing_stock * policy["unit_cost"] * self.HOLDING_RATE_DAILY
-                ordering_cost = self.ORDER_COST if restock_qty > 0 else 0
-
-                ledger.append({
-                    "date": date.date(),
-                    "opening_stock": int(current_stock),
-                    "demand": int(demand),
-                    "sold": int(sold),
-                    "unmet_demand": int(unmet),
-                    "closing_stock": int(closing_stock),
-                    "restock_qty": restock_qty,
-                    "holding_cost": float(holding_cost),
-                    "ordering_cost": int(ordering_cost),
-                    "supplier": str(supplier["supplier_id"])
-                })
-                current_stock = closing_stock
+            inputs = self._prepare_inputs(product_id, scenario_params)
+            demand = self._dense_demand(inputs)
+            outputs = _simulate_kernel(
+                demand,
+                inputs["initial_stock"],
+                inputs["reorder_point"],
+                inputs["order_qty"],
+                inputs["lead_time"],
+                inputs["unit_cost"],
+                float(self.HOLDING_RATE_DAILY),
+                int(self.ORDER_COST)
+            )
+            return self._build_ledger(inputs, demand, outputs)
 
-            return pd.DataFrame(ledger)
-        
         except Exception as e:
             st.error(f"Simulation failed: {str(e)}")
             return pd.DataFrame()
 
+    def simulate_products(self, product_ids, scenario_params=None):
+        """Simulate several products in one batched kernel call.
+
+        scenario_params optionally maps product_id to the overrides accepted by
+        simulate_product. Returns {product_id: ledger}; products that cannot be
+        simulated map to an empty DataFrame.
+        """
+        scenario_params = scenario_params or {}
+        results = {pid: pd.DataFrame() for pid in product_ids}
+        prepared = {}
+        for pid in product_ids:
+            try:
+                prepared[pid] = self._prepare_inputs(pid, scenario_params.get(pid))
+            except Exception as e:
+                st.error(f"Simulation failed for {pid}: {str(e)}")
+        if not prepared:
+            return results
+
+        pids = list(prepared)
+        n_days = np.array([len(prepared[pid]["dates"]) for pid in pids], dtype=np.int64)
+        horizon = pd.date_range(prepared[pids[0]]["dates"][0], periods=int(n_days.max()))
+
+        # (P, T) demand matrix, one row per product over the longest horizon
+        forecast = self.loader.forecast
+        demand = (
+            forecast[forecast["product_id"].isin(pids)]
+            .drop_duplicates(["product_id", "date"])
+            .pivot(index="date", columns="product_id", values="predicted_units")
+            .reindex(index=horizon, columns=pids)
+            .fillna(0)
+            .to_numpy(dtype=np.float64)
+            .T
+        )
+        field = lambda name, dtype: np.array([prepared[pid][name] for pid in pids], dtype=dtype)
+        outputs = _simulate_batch_kernel(
+            np.ascontiguousarray(demand),
+            n_days,
+            field("initial_stock", np.float64),
+            field("reorder_point", np.float64),
+            field("order_qty", np.int64),
+            field("lead_time", np.int64),
+            field("unit_cost", np.float64),
+            float(self.HOLDING_RATE_DAILY),
+            int(self.ORDER_COST)
+        )
+
+        for row, pid in enumerate(pids):
+            n = n_days[row]
+            results[pid] = self._build_ledger(
+                prepared[pid],
+                demand[row, :n],
+                tuple(out[row, :n] for out in outputs)
+            )
+        return results
+
+    def simulate_grid(self, product_id, eoq_range, rop_range, buffer_range, supplier_id=None):
+        """Sweep every (eoq, reorder_point, buffer_days) combination for one product.
+
+        Returns one row per scenario with its total cost and service level.
+        """
+        try:
+            inputs = self._prepare_inputs(
+                product_id, {'supplier_id': supplier_id} if supplier_id else None
+            )
+            grid = pd.DataFrame(
+                list(itertools.product(eoq_range, rop_range, buffer_range)),
+                columns=["eoq", "reorder_point", "buffer_days"]
+            ).astype(np.int64)
+            n_scenarios = len(grid)
+            demand = self._dense_demand(inputs)
+            reorder_point = grid["reorder_point"].to_numpy(dtype=np.float64)
+            initial_stock = self._calculate_initial_stock(
+                reorder_point,
+                inputs["lead_time"],
+                self.loader.get_forecast_arrays(product_id),
+                grid["buffer_days"].to_numpy()
+            )
+
+            # Every scenario shares the product's demand row and horizon
+            _, sold, _, _, _, holding_cost, ordering_cost = _simulate_batch_kernel(
+                np.tile(demand, (n_scenarios, 1)),
+                np.full(n_scenarios, len(demand), dtype=np.int64),
+                initial_stock.astype(np.float64),
+                reorder_point,
+                np.maximum(grid["eoq"].to_numpy(), inputs["moq"]),
+                np.full(n_scenarios, inputs["lead_time"], dtype=np.int64),
+                np.full(n_scenarios, inputs["unit_cost"]),
+                float(self.HOLDING_RATE_DAILY),
+                int(self.ORDER_COST)
+            )
+            # Same integer units as the simulation ledger
+            total_demand = max(demand.astype(np.int64).sum(), 1)
+            return grid.assign(
+                total_cost=holding_cost.sum(axis=1) + ordering_cost.sum(axis=1),
+                service_level=sold.astype(np.int64).sum(axis=1) / total_demand
+            )
+
+        except Exception as e:
+            st.error(f"Scenario sweep failed: {str(e)}")
+            return pd.DataFrame()
+
+    def _prepare_inputs(self, product_id, scenario_params=None):
+        """Resolve policy, supplier and horizon into kernel-ready scalars"""
+        # Load base data
+        data = self.loader.get_product_data(product_id)
+        if data["policy"] is None or data["suppliers"] is None or data["forecast"] is None:
+            raise KeyError(f"No policy, supplier or forecast data for {product_id}")
+        base_policy = data["policy"]
+        forecast = data["forecast"]
+
+        # Apply scenario overrides
+        if scenario_params:
+            supplier_id = scenario_params.get('supplier_id', base_policy['supplier_id'])
+
+            policy = base_policy.copy()
+            policy.update({
+                'eoq': scenario_params.get('eoq', base_policy['eoq']),
+                'reorder_point': scenario_params.get('reorder_point', base_policy['reorder_point']),
+                'safety_stock': scenario_params.get('safety_stock', base_policy['safety_stock'])
+            })
+            buffer_days = scenario_params.get('buffer_days', 7)
+        else:
+            supplier_id = base_policy['supplier_id']
+            policy = base_policy.copy()
+            buffer_days = 7
+        supplier = self.loader.get_supplier(product_id, supplier_id)
+        if supplier is None:
+            raise KeyError(f"Supplier {supplier_id} does not stock {product_id}")
+
+        # Forecast dates are parsed to datetime64 by the loader
+        lead_time = self._adjusted_lead_time(supplier)
+        end_date = START_DATE + timedelta(days=30 + lead_time)
+
+        return {
+            "dates": pd.date_range(START_DATE, end_date),
+            "forecast": forecast,
+            "supplier_id": str(supplier_id),
+            "initial_stock": float(self._calculate_initial_stock(
+                policy["reorder_point"], lead_time, self.loader.get_forecast_arrays(product_id), buffer_days
+            )),
+            "reorder_point": float(policy["reorder_point"]),
+            "order_qty": int(max(policy["eoq"], supplier["MOQ"])),
+            "moq": int(supplier["MOQ"]),
+            "lead_time": lead_time,
+            "unit_cost": float(policy["unit_cost"])
+        }
+
+    @staticmethod
+    def _dense_demand(inputs):
+        """Daily forecast units over the simulation horizon, 0 where missing"""
+        return (
+            inputs["forecast"].drop_duplicates("date")
+            .set_index("date")["predicted_units"]
+            .reindex(inputs["dates"], fill_value=0)
+            .to_numpy(dtype=np.float64)
+        )
+
+    @staticmethod
+    def _build_ledger(inputs, demand, outputs):
+        """Simulation ledger frame from kernel output arrays"""
+        opening, sold, unmet, closing, restock, holding_cost, ordering_cost = outputs
+        return pd.DataFrame({
+            "date": inputs["dates"].date,
+            "opening_stock": opening.astype(np.int64),
+            "demand": demand.astype(np.int64),
+            "sold": sold.astype(np.int64),
+            "unmet_demand": unmet.astype(np.int64),
+            "closing_stock": closing.astype(np.int64),
+            "restock_qty": restock,
+            "holding_cost": holding_cost,
+            "ordering_cost": ordering_cost,
+            "supplier": inputs["supplier_id"]
+        })
+
     def _adjusted_lead_time(self, supplier):
         """Apply reliability penalty to lead time"""
-        lead_time = int(supplier["lead_time"].item())
-        reliability_factor = (100 - supplier["reliability"].item()) / 100
+        lead_time = int(supplier["lead_time"])
+        reliability_factor = (100 - float(supplier["reliability"])) / 100
         return int(lead_time * (1 + reliability_factor))
 
-    def _calculate_initial_stock(self, policy, supplier, forecast, buffer_days):
-        """Calculate safety stock with customizable buffer"""
-        adjusted_lt = self._adjusted_lead_time(supplier)
-        start_date = pd.to_datetime("2025-04-01")
-        
-        # Lead time demand calculation
-        lt_demand = forecast[
-            forecast["date"].between(start_date, start_date + timedelta(days=adjusted_lt))
-        ]["predicted_units"].sum()
-        
+    def _calculate_initial_stock(self, reorder_point, adjusted_lt, forecast_arrays, buffer_days):
+        """Calculate safety stock with customizable buffer; vectorizes over
+        reorder_point and buffer_days arrays"""
+        end_date = START_DATE + timedelta(days=adjusted_lt)
+        dates, units, daily_std = forecast_arrays
+
+        # Lead time demand calculation over the date-sorted forecast
+        lo = np.searchsorted(dates, START_DATE.value, side="left")
+        hi = np.searchsorted(dates, end_date.value, side="right")
+        lt_demand = units[lo:hi].sum()
+
         # Safety stock with configurable buffer
-        daily_std = forecast["predicted_units"].std()
-        safety_stock = np.ceil(1.65 * daily_std * np.sqrt(adjusted_lt + buffer_days))
-        
-        return max(policy["reorder_point"], int(lt_demand + safety_stock))
+        safety_stock = np.ceil(1.65 * daily_std * np.sqrt(adjusted_lt + np.asarray(buffer_days)))
+
+        return np.maximum(reorder_point, np.trunc(lt_demand + safety_stock))
+
+@st.cache_data(show_spinner=False)
+def _cached_sim(_loader, product_id, params_key=None):
+    """Simulation ledger per (product, scenario); the shared loader is not hashed"""
+    return InventorySimulator(_loader).simulate_product(
+        product_id, dict(params_key) if params_key else None
+    )
 
 def what_if_tab():
     """Interactive scenario analysis with comparison capabilities"""
@@ -130,7 +344,6 @@ def what_if_tab():
         return
     
     loader = st.session_state.data_loader
-    simulator = InventorySimulator(loader)
     
     # Product selection
     product = st.selectbox(
@@ -145,9 +358,10 @@ def what_if_tab():
         
         with col1:
             # Supplier selection
-            suppliers = loader.suppliers.query(f"products == '{product}'")
-            current_supplier = loader.policies.query(
-                f"product_id == '{product}'")["supplier_id"].iloc[0]
+            product_data = loader.get_product_data(product)
+            policy = product_data["policy"]
+            suppliers = product_data["suppliers"]
+            current_supplier = policy["supplier_id"]
             selected_supplier = st.selectbox(
                 "Supplier",
                 suppliers["supplier_id"].tolist(),
@@ -156,8 +370,7 @@ def what_if_tab():
             )
             
             # EOQ configuration
-            current_eoq = loader.policies.query(
-                f"product_id == '{product}'")["eoq"].iloc[0]
+            current_eoq = policy["eoq"]
             new_eoq = st.number_input(
                 "Economic Order Quantity (EOQ)", 
                 min_value=int(suppliers["MOQ"].min()),
@@ -167,8 +380,7 @@ def what_if_tab():
             
         with col2:
             # Reorder point configuration
-            current_rop = loader.policies.query(
-                f"product_id == '{product}'")["reorder_point"].iloc[0]
+            current_rop = policy["reorder_point"]
             new_rop = st.number_input(
                 "Reorder Point (ROP)",
                 min_value=0,
@@ -187,7 +399,7 @@ def what_if_tab():
     if st.button("▶️ Compare Scenarios", type="primary"):
         with st.spinner("Analyzing scenarios..."):
             # Base scenario
-            base_results = simulator.simulate_product(product)
+            base_results = _cached_sim(loader, product)
             
             # Custom scenario
             scenario_params = {
@@ -196,7 +408,7 @@ def what_if_tab():
                 'reorder_point': new_rop,
                 'buffer_days': buffer_days
             }
-            scenario_results = simulator.simulate_product(product, scenario_params)
+            scenario_results = _cached_sim(loader, product, tuple(sorted(scenario_params.items())))
             
             if not base_results.empty and not scenario_results.empty:
                 # Metrics calculation
@@ -260,8 +472,8 @@ def what_if_tab():
                 
                 # Supplier comparison matrix
                 st.subheader("Supplier Comparison")
-                current_supplier_data = suppliers.query(f"supplier_id == '{current_supplier}'").iloc[0]
-                scenario_supplier_data = suppliers.query(f"supplier_id == '{selected_supplier}'").iloc[0]
+                current_supplier_data = loader.get_supplier(product, current_supplier)
+                scenario_supplier_data = loader.get_supplier(product, selected_supplier)
                 
                 comparison_df = pd.DataFrame({
                     "Metric": ["Supplier ID", "Lead Time", "MOQ", "Reliability", "Unit Cost"],
@@ -300,4 +512,33 @@ def what_if_tab():
                            delta=f"{(service_scenario - service_base):.1%}")
                 
             else:
-                st.warning("Simulation failed to generate comparable results")
\ No newline at end of file
+                st.warning("Simulation failed to generate comparable results")
+
+    # Sensitivity sweep around the chosen parameters
+    with st.expander("📈 Sensitivity Sweep"):
+        st.caption("Simulates every EOQ, reorder point and buffer combination from 50% to 150% of the values above")
+        if st.button("Run Sweep"):
+            with st.spinner("Sweeping scenarios..."):
+                span = np.linspace(0.5, 1.5, 10)
+                grid = InventorySimulator(loader).simulate_grid(
+                    product,
+                    np.unique((span * new_eoq).astype(int)),
+                    np.unique((span * new_rop).astype(int)),
+                    np.unique([0, buffer_days // 2, buffer_days, min(2 * buffer_days, 14)]),
+                    supplier_id=selected_supplier
+                )
+            if not grid.empty:
+                fig = px.scatter_matrix(
+                    grid,
+                    dimensions=["eoq", "reorder_point", "buffer_days", "total_cost", "service_level"],
+                    color="total_cost",
+                    labels={
+                        "eoq": "EOQ",
+                        "reorder_point": "ROP",
+                        "buffer_days": "Buffer Days",
+                        "total_cost": "Total Cost",
+                        "service_level": "Service Level"
+                    },
+                    title=f"Cost / Service Surface - {product} ({len(grid)} scenarios)"
+                )
+                st.plotly_chart(fig, use_container_width=True)
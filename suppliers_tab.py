@@ -1,21 +1,24 @@
 import streamlit as st
-import pandas as pd
 import os
 from pathlib import Path
+from data_loader import read_csv_cached
 print("suppliers_tab.py loaded")
 
 # Constants
-SUMMARY_CSV = (r"D:\middle_ground_inventory\supplier_comparison\summary_report.csv")
-REPORT_DIR = Path("D:/middle_ground_inventory/supplier_comparison/")
+REPORT_DIR = Path(__file__).resolve().parent / "data" / "supplier_comparison"
+SUMMARY_CSV = REPORT_DIR / "summary_report.csv"
 
 def load_data():
-    summary_df = pd.read_csv(SUMMARY_CSV)
+    summary_df = read_csv_cached(SUMMARY_CSV)
     return summary_df
 
 def render_supplier_tab():
     st.header("🔍 Supplier Studio")
     st.markdown("Explore supplier rankings, comparisons, and opportunities for cost optimization.")
 
+    if not SUMMARY_CSV.exists():
+        st.warning(f"No supplier comparison summary found in {REPORT_DIR}.")
+        return
     summary_df = load_data()
 
     # --- Select Product for Comparison ---
@@ -28,7 +31,7 @@ def render_supplier_tab():
         chart_png = REPORT_DIR / product_row["visualization"]
 
         if report_csv.exists():
-            compare_df = pd.read_csv(report_csv)
+            compare_df = read_csv_cached(report_csv)
 
             st.markdown(f"### 📈 Cost Breakdown — Product `{selected_product}`")
             st.image(str(chart_png), caption="Supplier Cost Comparison Chart", use_column_width=True)
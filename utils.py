@@ -1,5 +1,11 @@
 # dashboard/utils.py
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
+import streamlit as st
+
+# Roughly one point per horizontal pixel of a wide chart
+MAX_PLOT_POINTS = 2000
 
 def format_number(n):
     return f"{int(n):,}"
@@ -17,3 +23,31 @@ def get_forecast_sparkline(forecast_df, product_id):
     )
     return fig
 
+def downsample_minmax(df, y, n_out=MAX_PLOT_POINTS):
+    """Keep each bucket's min and max row so the line silhouette survives.
+
+    Rows are assumed to be in x order. Frames already under n_out rows are
+    returned unchanged.
+    """
+    columns = [y] if isinstance(y, str) else list(y)
+    n = len(df)
+    if n <= n_out:
+        return df
+
+    n_buckets = max(n_out // (2 * len(columns)), 1)
+    buckets = np.arange(n) * n_buckets // n
+    keep = [np.array([0, n - 1])]
+    for col in columns:
+        grouped = pd.Series(df[col].to_numpy()).groupby(buckets)
+        keep.append(grouped.idxmin().to_numpy())
+        keep.append(grouped.idxmax().to_numpy())
+    return df.iloc[np.unique(np.concatenate(keep))]
+
+def memo_figure(name, key, build):
+    """Reuse this session's last figure for a chart while its inputs are unchanged"""
+    slot = f"_fig_{name}"
+    cached = st.session_state.get(slot)
+    if cached is None or cached[0] != key:
+        cached = (key, build())
+        st.session_state[slot] = cached
+    return cached[1]